@@ -4,15 +4,16 @@
 
 import math
 import time
+from dataclasses import dataclass
 from datetime import datetime
 from io import BytesIO
 
 import numpy as np
-import pandas as pd
 import plotly.graph_objects as go
 import qrcode
 from PIL import Image
 import streamlit as st
+from numba import njit
 
 
 # =============================================================================
@@ -36,6 +37,14 @@ SUBTITLE = "Hermosillo — Experience Matters"
 # =============================================================================
 # State
 # =============================================================================
+def pack_checklist(checklist):
+    # Bit i is set when checklist item i is NOT checked, so int.bit_count() gives the gaps.
+    bits = 0
+    for i, done in enumerate(checklist.values()):
+        bits |= (not done) << i
+    return bits
+
+
 def init_state():
     defaults = dict(
         dark_mode=False,
@@ -68,6 +77,8 @@ def init_state():
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
+    if "checklist_bits" not in st.session_state:
+        st.session_state.checklist_bits = pack_checklist(st.session_state.checklist)
 
 
 def reset_all():
@@ -99,8 +110,9 @@ init_state()
 # =============================================================================
 # CSS (only styles; no wrapper tags around widgets)
 # =============================================================================
-def inject_css():
-    if st.session_state.dark_mode:
+@st.cache_resource
+def _css_for(dark: bool) -> str:
+    if dark:
         paper = "#0B1220"
         surface = "#111827"
         stroke = "#1F2937"
@@ -117,8 +129,7 @@ def inject_css():
         shadow = "0 8px 24px rgba(2,6,23,0.08)"
         band_bg = "#F3F4F6"
 
-    st.markdown(
-        f"""
+    return f"""
         <style>
         :root {{
             --brand-orange: {BRAND["orange"]};
@@ -191,9 +202,11 @@ def inject_css():
             margin: -12px -12px 6px -12px;  /* stretch to card edges */
         }}
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+
+
+def inject_css():
+    st.markdown(_css_for(st.session_state.dark_mode), unsafe_allow_html=True)
 
 
 inject_css()
@@ -202,6 +215,65 @@ inject_css()
 # =============================================================================
 # Computation & Visualization
 # =============================================================================
+# Scenario fields the simulation reads; "project" and "sent_at" are display-only.
+SIM_INPUTS = (
+    "project_type", "structural_system", "area_m2", "envelope", "quality", "region", "opts", "checklist_bits",
+)
+
+PROJECT_TYPES = ("Warehouse", "Office", "Retail")
+STRUCTURES = ("Steel", "Concrete")
+ENVELOPES = ("Standard", "Insulated")
+QUALITIES = ("Basic", "Standard", "Premium")
+REGIONS = ("North", "Central", "South")
+PT_IDX = {name: i for i, name in enumerate(PROJECT_TYPES)}
+ST_IDX = {name: i for i, name in enumerate(STRUCTURES)}
+ENV_IDX = {name: i for i, name in enumerate(ENVELOPES)}
+Q_IDX = {name: i for i, name in enumerate(QUALITIES)}
+R_IDX = {name: i for i, name in enumerate(REGIONS)}
+
+# Cost lookup tables, indexed by the *_IDX positions above.
+BASE_ARR = np.array([[420, 450], [520, 560], [480, 510]])  # USD/m², [project_type, structure]
+REGION_ARR = np.array([0.95, 1.00, 1.05])
+ENV_ARR = np.array([1.00, 1.08])
+QUALITY_ARR = np.array([0.95, 1.00, 1.12])
+ADDERS = {"skylights": 8, "mezzanine": 60, "hvac": 45}  # USD/m² per option
+OPTIONS = tuple(ADDERS)  # bit i of opts_bits is OPTIONS[i]
+ADDER_ARR = np.array([float(v) for v in ADDERS.values()])
+BUCKET_LABELS = ("Structure", "Envelope", "MEP", "Finishes", "Contingency")
+BUCKET_SHARES = np.array([0.35, 0.18, 0.20, 0.22])  # of total; Contingency takes the remainder
+QUANTITY_LABELS = ("Steel (t)", "Concrete (m³)")
+STEEL = ST_IDX["Steel"]
+SOUTH = R_IDX["South"]
+MEZZANINE_BIT = OPTIONS.index("mezzanine")
+HVAC_BIT = OPTIONS.index("hvac")
+BOX_RATIOS = {"Warehouse": 2.2, "Office": 1.2, "Retail": 1.6}  # 3D preview length:width
+BOX_HEIGHTS = {"Basic": 9, "Standard": 11, "Premium": 13}  # 3D preview height (m)
+
+# Columns of compute_simulation_vec's result. Money columns are unrounded;
+# quantities are rounded because CO₂ is derived from the rounded values.
+SIM_COLUMNS = (
+    "unit_cost", "total_cost", "contingency_pct", "steel_t", "concrete_m3",
+    "co2_tons", "lead_time_wks", "subtotal_no_cont", "adders_per_m2",
+)
+N_SIM_COLUMNS = len(SIM_COLUMNS)
+
+# Box vertices 0-3 are the floor, 4-7 the roof. CUBE_I/J/K are the Mesh3d
+# triangles; each EDGES row is one edge of the box.
+CUBE_I = (0, 0, 0, 1, 2, 4, 5, 6, 7, 3, 1, 2)
+CUBE_J = (1, 4, 3, 5, 3, 5, 6, 7, 4, 2, 5, 6)
+CUBE_K = (4, 5, 7, 6, 7, 1, 2, 4, 0, 1, 4, 5)
+EDGES = np.array([[0, 1], [1, 2], [2, 3], [3, 0], [4, 5], [5, 6], [6, 7], [7, 4], [0, 4], [1, 5], [2, 6], [3, 7]])
+
+# Shared chart layout pieces (go.Figure copies them, so sharing is safe).
+TIGHT_MARGIN = {"l": 10, "r": 10, "t": 10, "b": 10}
+ZERO_MARGIN = {"l": 0, "r": 0, "t": 0, "b": 0}
+SCENE_NO_AXES = {"xaxis": {"visible": False}, "yaxis": {"visible": False}, "zaxis": {"visible": False}, "aspectmode": "data"}
+
+# Chart rule: any trace with more than 1k points must use the WebGL variant
+# ("scattergl" traces, render_mode="webgl" for px calls), mirroring Plotly Express,
+# which switches to WebGL above 1000 rows. SVG stalls the browser past that.
+
+
 def capture_scenario():
     return {
         "project": st.session_state.project,
@@ -216,83 +288,166 @@ def capture_scenario():
             "mezzanine": st.session_state.opt_mezzanine,
             "hvac": st.session_state.opt_hvac,
         },
-        "checklist": st.session_state.checklist,
+        "checklist_bits": st.session_state.checklist_bits,
         "sent_at": st.session_state.last_sent_ts,
     }
 
 
+def freeze_scenario(scn: dict):
+    """Hashable (tuple) form of a scenario's SIM_INPUTS, used as the cache key."""
+    return tuple(
+        (k, tuple(sorted(scn[k].items())) if isinstance(scn[k], dict) else scn[k]) for k in SIM_INPUTS
+    )
+
+
+def thaw_scenario(scn_key):
+    scn = dict(scn_key)
+    scn["opts"] = dict(scn["opts"])
+    return scn
+
+
+@st.cache_data(max_entries=16)
+def unit_cost_cube(pt_idx, st_idx):
+    """Base unit cost (USD/m², before adders) for every region x envelope x quality."""
+    # Charts read slices of this, e.g. cube[r, e, :] is the cost-vs-quality line.
+    region = REGION_ARR[:, None, None]
+    env = ENV_ARR[None, :, None]
+    quality = QUALITY_ARR[None, None, :]
+    return BASE_ARR[pt_idx, st_idx] * region * env * quality
+
+
 def compute_simulation(scn: dict):
-    base_table = {
-        ("Warehouse", "Steel"): 420,
-        ("Warehouse", "Concrete"): 450,
-        ("Office", "Steel"): 520,
-        ("Office", "Concrete"): 560,
-        ("Retail", "Steel"): 480,
-        ("Retail", "Concrete"): 510,
-    }
-    base = base_table[(scn["project_type"], scn["structural_system"])]
-    region_mult = {"North": 0.95, "Central": 1.00, "South": 1.05}[scn["region"]]
-    envelope_mult = {"Standard": 1.00, "Insulated": 1.08}[scn["envelope"]]
-    quality_mult = {"Basic": 0.95, "Standard": 1.00, "Premium": 1.12}[scn["quality"]]
-    unit_cost_base = base * region_mult * envelope_mult * quality_mult
-
-    adders = 0
-    if scn["opts"]["skylights"]:
-        adders += 8
-    if scn["opts"]["mezzanine"]:
-        adders += 60
-    if scn["opts"]["hvac"]:
-        adders += 45
+    return _compute_simulation_cached(freeze_scenario(scn))
 
-    unchecked = sum(1 for v in scn["checklist"].values() if not v)
-    contingency_pct = min(unchecked * 0.005, 0.05)
 
-    area = scn["area_m2"]
-    subtotal = area * (unit_cost_base + adders)
-    total = subtotal * (1 + contingency_pct)
-
-    structure = total * 0.35
-    envelope = total * 0.18
-    mep = total * 0.20
-    finishes = total * 0.22
-    contingency_val = total - (structure + envelope + mep + finishes)
-
-    if scn["structural_system"] == "Steel":
-        steel_t = round(area * 0.02, 1)
-        conc_m3 = round(area * 0.05, 1)
-        co2 = round(steel_t * 1.8 + conc_m3 * 0.1, 1)
-        lead_weeks = 14 if scn["opts"]["mezzanine"] else 12
-    else:
-        steel_t = round(area * 0.008, 1)
-        conc_m3 = round(area * 0.12, 1)
-        co2 = round(steel_t * 1.4 + conc_m3 * 0.22, 1)
-        lead_weeks = 16 if scn["opts"]["mezzanine"] else 14
+def pack_opts(opts):
+    return sum(1 << b for b, name in enumerate(OPTIONS) if opts[name])
 
-    if scn["opts"]["hvac"]:
-        lead_weeks += 1
-    if scn["region"] == "South":
-        lead_weeks += 1
 
-    unit_cost_total = total / area if area else 0
+@njit(cache=True)
+def option_adders(opts_bits):
+    """USD/m² added by the options set in opts_bits."""
+    adders = 0.0
+    for b in range(ADDER_ARR.shape[0]):
+        if (opts_bits >> b) & 1:
+            adders += ADDER_ARR[b]
+    return adders
 
-    return {
-        "unit_cost": round(unit_cost_total, 2),
-        "total_cost": round(total, 0),
-        "contingency_pct": round(contingency_pct * 100, 1),
-        "steel_t": steel_t,
-        "concrete_m3": conc_m3,
-        "co2_tons": co2,
-        "lead_time_wks": int(lead_weeks),
-        "cost_buckets": {
-            "Structure": round(structure, 0),
-            "Envelope": round(envelope, 0),
-            "MEP": round(mep, 0),
-            "Finishes": round(finishes, 0),
-            "Contingency": round(contingency_val, 0),
+
+@njit(cache=True)
+def contingency_fraction(unchecked_count):
+    """Contingency as a fraction of subtotal: 0.5% per open checklist item, capped at 5%."""
+    return min(unchecked_count * 0.005, 0.05)
+
+
+def _adders_and_contingency(scn):
+    """Option adders (USD/m²) and contingency fraction for one scenario; used by the quality sweep."""
+    unchecked = scn["checklist_bits"].bit_count()
+    return option_adders(pack_opts(scn["opts"])), contingency_fraction(unchecked)
+
+
+@njit(cache=True)
+def compute_simulation_vec(pt_idx, st_idx, area, env_idx, q_idx, r_idx, opts_bits, unchecked_count):
+    """Evaluate N scenarios given as parallel index/value arrays; returns an (N, len(SIM_COLUMNS)) array."""
+    n = area.shape[0]
+    out = np.empty((n, N_SIM_COLUMNS))
+    for s in range(n):
+        unit_cost_base = (
+            BASE_ARR[pt_idx[s], st_idx[s]] * REGION_ARR[r_idx[s]] * ENV_ARR[env_idx[s]] * QUALITY_ARR[q_idx[s]]
+        )
+        adders = option_adders(opts_bits[s])
+        contingency_pct = contingency_fraction(unchecked_count[s])
+
+        a = area[s]
+        subtotal = a * (unit_cost_base + adders)
+        total = subtotal * (1 + contingency_pct)
+
+        mezzanine = (opts_bits[s] >> MEZZANINE_BIT) & 1
+        if st_idx[s] == STEEL:
+            steel_t = round(a * 0.02, 1)
+            conc_m3 = round(a * 0.05, 1)
+            co2 = round(steel_t * 1.8 + conc_m3 * 0.1, 1)
+            lead_weeks = 14 if mezzanine else 12
+        else:
+            steel_t = round(a * 0.008, 1)
+            conc_m3 = round(a * 0.12, 1)
+            co2 = round(steel_t * 1.4 + conc_m3 * 0.22, 1)
+            lead_weeks = 16 if mezzanine else 14
+        if (opts_bits[s] >> HVAC_BIT) & 1:
+            lead_weeks += 1
+        if r_idx[s] == SOUTH:
+            lead_weeks += 1
+
+        out[s, 0] = total / a if a else 0.0
+        out[s, 1] = total
+        out[s, 2] = contingency_pct * 100
+        out[s, 3] = steel_t
+        out[s, 4] = conc_m3
+        out[s, 5] = co2
+        out[s, 6] = lead_weeks
+        out[s, 7] = subtotal
+        out[s, 8] = adders
+    return out
+
+
+@dataclass(slots=True)
+class CalcResult:
+    unit_cost: float
+    total_cost: float
+    contingency_pct: float
+    co2_tons: float
+    lead_time_wks: int
+    bucket_values: np.ndarray  # aligned with BUCKET_LABELS
+    quantity_values: np.ndarray  # aligned with QUANTITY_LABELS
+    subtotal_no_cont: float
+    adders_per_m2: int
+    display: dict  # pre-formatted KPI strings for show_kpis
+
+
+@st.cache_data(max_entries=128)
+def _compute_simulation_cached(scn_key):
+    # Single-scenario UI path: a batch of one through compute_simulation_vec.
+    scn = thaw_scenario(scn_key)
+    unchecked = scn["checklist_bits"].bit_count()
+    row = compute_simulation_vec(
+        np.array([PT_IDX[scn["project_type"]]]),
+        np.array([ST_IDX[scn["structural_system"]]]),
+        np.array([float(scn["area_m2"])]),
+        np.array([ENV_IDX[scn["envelope"]]]),
+        np.array([Q_IDX[scn["quality"]]]),
+        np.array([R_IDX[scn["region"]]]),
+        np.array([pack_opts(scn["opts"])]),
+        np.array([unchecked]),
+    )[0]
+    unit_cost, total, contingency_pct, steel_t, conc_m3, co2, lead_weeks, subtotal, adders = row.tolist()
+
+    buckets = total * BUCKET_SHARES
+    bucket_values = np.round(np.append(buckets, total - buckets.sum()), 0)
+
+    unit_cost = round(unit_cost, 2)
+    total_cost = round(total, 0)
+    contingency_pct = round(contingency_pct, 1)
+    lead_weeks = int(lead_weeks)
+
+    return CalcResult(
+        unit_cost=unit_cost,
+        total_cost=total_cost,
+        contingency_pct=contingency_pct,
+        co2_tons=co2,
+        lead_time_wks=lead_weeks,
+        bucket_values=bucket_values,
+        quantity_values=np.array([steel_t, conc_m3]),
+        subtotal_no_cont=round(subtotal, 0),
+        adders_per_m2=int(adders),
+        # Formatted once here (and cached with the result) for show_kpis.
+        display={
+            "total_cost": f"${total_cost:,.0f}",
+            "unit_cost": f"${unit_cost:,.2f}",
+            "contingency_pct": f"{contingency_pct}%",
+            "co2_tons": f"{co2:,.1f}",
+            "lead_time_wks": f"{lead_weeks} wks",
         },
-        "subtotal_no_cont": round(subtotal, 0),
-        "adders_per_m2": adders,
-    }
+    )
 
 
 def show_scenario_summary(scn, calc):
@@ -321,92 +476,130 @@ def show_scenario_summary(scn, calc):
             notes.append("Mezzanine included")
         if scn["opts"]["hvac"]:
             notes.append("HVAC included")
-        unchecked = [k for k, v in scn["checklist"].items() if not v]
+        unchecked = scn["checklist_bits"].bit_count()
         if unchecked:
-            notes.append(f"Checklist gaps: {len(unchecked)} (↑ contingency)")
+            notes.append(f"Checklist gaps: {unchecked} (↑ contingency)")
         st.write("• " + "\n• ".join(notes) if notes else "No special options")
 
 
+def session_figure(name, build):
+    """The session's figure `name`: built once with `build()`, then updated in place each rerun."""
+    key = f"_{name}_fig"
+    if key not in st.session_state:
+        st.session_state[key] = build()
+    return st.session_state[key]
+
+
+# Figures are declared as plain dicts (no go.Pie/go.Bar/... instances) and
+# built with skip_invalid=True.
+def _new_3d_box():
+    mesh = {"type": "mesh3d", "i": CUBE_I, "j": CUBE_J, "k": CUBE_K, "color": BRAND["orange"], "opacity": 0.3}
+    edges = {"type": "scatter3d", "mode": "lines", "line": {"width": 4}}
+    layout = {"scene": SCENE_NO_AXES, "margin": ZERO_MARGIN, "showlegend": False}
+    return go.Figure({"data": [mesh, edges], "layout": layout}, skip_invalid=True)
+
+
 def make_3d_box(scn):
-    ratios = {"Warehouse": 2.2, "Office": 1.2, "Retail": 1.6}
-    ratio = ratios.get(scn["project_type"], 1.5)
+    ratio = BOX_RATIOS.get(scn["project_type"], 1.5)
     area = max(scn["area_m2"], 1)
     length = math.sqrt(area * ratio)
     width = area / length
-    base_height = {"Basic": 9, "Standard": 11, "Premium": 13}[scn["quality"]]
+    base_height = BOX_HEIGHTS[scn["quality"]]
     if scn["opts"]["mezzanine"]:
         base_height += 2
 
-    x = [0, length, length, 0, 0, length, length, 0]
-    y = [0, 0, width, width, 0, 0, width, width]
-    z = [0, 0, 0, 0, base_height, base_height, base_height, base_height]
-    i = [0, 0, 0, 1, 2, 4, 5, 6, 7, 3, 1, 2]
-    j = [1, 4, 3, 5, 3, 5, 6, 7, 4, 2, 5, 6]
-    k = [4, 5, 7, 6, 7, 1, 2, 4, 0, 1, 4, 5]
-
-    mesh = go.Mesh3d(x=x, y=y, z=z, i=i, j=j, k=k, color=BRAND["orange"], opacity=0.3)
-    edges = go.Scatter3d(
-        x=[x[0], x[1], None, x[1], x[2], None, x[2], x[3], None, x[3], x[0], None,
-           x[4], x[5], None, x[5], x[6], None, x[6], x[7], None, x[7], x[4], None,
-           x[0], x[4], None, x[1], x[5], None, x[2], x[6], None, x[3], x[7], None],
-        y=[y[0], y[1], None, y[1], y[2], None, y[2], y[3], None, y[3], y[0], None,
-           y[4], y[5], None, y[5], y[6], None, y[6], y[7], None, y[7], y[4], None,
-           y[0], y[4], None, y[1], y[5], None, y[2], y[6], None, y[3], y[7], None],
-        z=[z[0], z[1], None, z[1], z[2], None, z[2], z[3], None, z[3], z[0], None,
-           z[4], z[5], None, z[5], z[6], None, z[6], z[7], None, z[7], z[4], None,
-           z[0], z[4], None, z[1], z[5], None, z[2], z[6], None, z[3], z[7], None],
-        mode="lines",
-        line=dict(width=4),
-    )
-    scene = dict(xaxis=dict(visible=False), yaxis=dict(visible=False), zaxis=dict(visible=False), aspectmode="data")
-    fig = go.Figure(data=[mesh, edges])
-    fig.update_layout(
-        scene=scene,
-        margin=dict(l=0, r=0, t=0, b=0),
-        paper_bgcolor=("#0B1220" if st.session_state.dark_mode else BRAND["paper"]),
-        showlegend=False,
+    h = base_height
+    coords = np.array(
+        [[0, 0, 0], [length, 0, 0], [length, width, 0], [0, width, 0],
+         [0, 0, h], [length, 0, h], [length, width, h], [0, width, h]]
     )
+    # One NaN row after every edge segment: Plotly breaks the line at NaN.
+    segments = np.concatenate([coords[EDGES], np.full((len(EDGES), 1, 3), np.nan)], axis=1).reshape(-1, 3)
+
+    fig = session_figure("box3d", _new_3d_box)
+    fig.data[0].update(x=coords[:, 0], y=coords[:, 1], z=coords[:, 2])
+    fig.data[1].update(x=segments[:, 0], y=segments[:, 1], z=segments[:, 2])
+    fig.update_layout(paper_bgcolor=("#0B1220" if st.session_state.dark_mode else BRAND["paper"]))
     return fig
 
 
 def show_kpis(calc):
     c1, c2, c3, c4, c5 = st.columns(5)
-    c1.metric("Total Cost", f"${calc['total_cost']:,.0f}")
-    c2.metric("Unit Cost (USD/m²)", f"${calc['unit_cost']:,.2f}")
-    c3.metric("Contingency", f"{calc['contingency_pct']}%")
-    c4.metric("CO₂ (tCO₂e)", f"{calc['co2_tons']:,.1f}")
-    c5.metric("Lead Time", f"{calc['lead_time_wks']} wks")
-
-
-def make_donut(bucket_dict):
-    labels = list(bucket_dict.keys())
-    values = list(bucket_dict.values())
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=0.55, textinfo="label+percent")])
-    fig.update_traces(hoverinfo="label+value+percent", pull=[0.02] * len(labels))
-    fig.update_layout(margin=dict(l=10, r=10, t=10, b=10))
+    display = calc.display
+    c1.metric("Total Cost", display["total_cost"])
+    c2.metric("Unit Cost (USD/m²)", display["unit_cost"])
+    c3.metric("Contingency", display["contingency_pct"])
+    c4.metric("CO₂ (tCO₂e)", display["co2_tons"])
+    c5.metric("Lead Time", display["lead_time_wks"])
+
+
+def _new_donut():
+    pie = {"type": "pie", "hole": 0.55, "textinfo": "label+percent", "hoverinfo": "label+value+percent"}
+    layout = {"margin": TIGHT_MARGIN}
+    return go.Figure({"data": [pie], "layout": layout}, skip_invalid=True)
+
+
+def make_donut(calc):
+    fig = session_figure("donut", _new_donut)
+    fig.data[0].update(labels=BUCKET_LABELS, values=calc.bucket_values, pull=[0.02] * len(BUCKET_LABELS))
     return fig
 
 
+def _new_quantities_bar():
+    layout = {"margin": TIGHT_MARGIN, "yaxis": {"title": {"text": ""}}}
+    return go.Figure({"data": [{"type": "bar"}], "layout": layout}, skip_invalid=True)
+
+
 def make_quantities_bar(calc):
-    df = pd.DataFrame({"Quantity": ["Steel (t)", "Concrete (m³)"], "Value": [calc["steel_t"], calc["concrete_m3"]]})
-    fig = go.Figure(data=[go.Bar(x=df["Quantity"], y=df["Value"])])
-    fig.update_layout(margin=dict(l=10, r=10, t=10, b=10), yaxis_title="")
+    fig = session_figure("quantities", _new_quantities_bar)
+    fig.data[0].update(x=QUANTITY_LABELS, y=calc.quantity_values)
     return fig
 
 
+def _new_quality_line():
+    line = {"type": "scattergl", "mode": "lines+markers"}
+    layout = {"margin": TIGHT_MARGIN, "yaxis": {"title": {"text": "USD/m²"}}}
+    return go.Figure({"data": [line], "layout": layout}, skip_invalid=True)
+
+
 def make_quality_line(scn, _calc):
-    qualities = ["Basic", "Standard", "Premium"]
-    unit_costs = []
-    for q in qualities:
-        scn2 = dict(scn)
-        scn2["quality"] = q
-        c2 = compute_simulation(scn2)
-        unit_costs.append(c2["unit_cost"])
-    fig = go.Figure(data=[go.Scatter(x=qualities, y=unit_costs, mode="lines+markers")])
-    fig.update_layout(margin=dict(l=10, r=10, t=10, b=10), yaxis_title="USD/m²")
+    cube = unit_cost_cube(PT_IDX[scn["project_type"]], ST_IDX[scn["structural_system"]])
+    adders, contingency_pct = _adders_and_contingency(scn)
+    unit_base = cube[R_IDX[scn["region"]], ENV_IDX[scn["envelope"]], :]
+    # Same arithmetic and rounding as the Unit Cost KPI, so the selected point matches it exactly.
+    area = scn["area_m2"]
+    totals = area * (unit_base + adders) * (1 + contingency_pct)
+    unit_costs = [round(u, 2) for u in (totals / area).tolist()]
+    fig = session_figure("quality_line", _new_quality_line)
+    fig.data[0].update(x=QUALITIES, y=unit_costs)
     return fig
 
 
+def dashboard_render(scn):
+    """(calc, figures) for the dashboard; recomputed only when the scenario (or theme) changed."""
+    scn_key = (freeze_scenario(scn), st.session_state.dark_mode)
+    if scn_key != st.session_state.get("_last_scn_key"):
+        calc = compute_simulation(scn)
+        figs = {
+            "box3d": make_3d_box(scn),
+            "donut": make_donut(calc),
+            "quantities": make_quantities_bar(calc),
+            "quality_line": make_quality_line(scn, calc),
+        }
+        st.session_state._last_render = (calc, figs)
+        st.session_state._last_scn_key = scn_key
+    return st.session_state._last_render
+
+
+@st.cache_data(max_entries=32)
+def make_qr_png(url: str) -> bytes:
+    img = qrcode.make(url)
+    bio = BytesIO()
+    # Fastest zlib level: same pixels, much cheaper encode for a small QR image.
+    img.save(bio, format="PNG", compress_level=1, optimize=False)
+    return bio.getvalue()
+
+
 # =============================================================================
 # Header
 # =============================================================================
@@ -469,7 +662,9 @@ left, right = st.columns([0.9, 1.1], gap="large")
 # -----------------------------------------------------------------------------
 # Left: Phone Panel (only Streamlit containers)
 # -----------------------------------------------------------------------------
-with left:
+# Fragment: edits and the share button rerun only the phone, not the dashboard.
+@st.fragment
+def render_phone():
     st.markdown("#### Phone (Simulation)")
 
     # narrow the card visually (CSS targets this wrapper)
@@ -485,55 +680,54 @@ with left:
 
                 c1, c2 = st.columns(2)
                 with c1:
-                    st.session_state.project_type = st.selectbox(
+                    project_type = st.selectbox(
                         "Project Type",
-                        ["Warehouse", "Office", "Retail"],
-                        index=["Warehouse", "Office", "Retail"].index(st.session_state.project_type),
+                        PROJECT_TYPES,
+                        index=PT_IDX[st.session_state.project_type],
                     )
                 with c2:
-                    st.session_state.structural_system = st.radio(
+                    structural_system = st.radio(
                         "Structural System",
-                        ["Steel", "Concrete"],
+                        STRUCTURES,
                         horizontal=True,
-                        index=["Steel", "Concrete"].index(st.session_state.structural_system),
+                        index=ST_IDX[st.session_state.structural_system],
                     )
 
-                st.session_state.built_area = st.slider("Built Area (m²)", 500, 50000, int(st.session_state.built_area), step=500)
+                built_area = st.slider("Built Area (m²)", 500, 50000, int(st.session_state.built_area), step=500)
 
                 c3, c4, c5 = st.columns(3)
                 with c3:
-                    st.session_state.envelope = st.selectbox(
+                    envelope = st.selectbox(
                         "Envelope",
-                        ["Standard", "Insulated"],
-                        index=["Standard", "Insulated"].index(st.session_state.envelope),
+                        ENVELOPES,
+                        index=ENV_IDX[st.session_state.envelope],
                     )
                 with c4:
-                    st.session_state.quality = st.select_slider(
-                        "Quality Level", options=["Basic", "Standard", "Premium"], value=st.session_state.quality
+                    quality = st.select_slider(
+                        "Quality Level", options=QUALITIES, value=st.session_state.quality
                     )
                 with c5:
-                    st.session_state.region = st.selectbox(
+                    region = st.selectbox(
                         "Region (Cost Index)",
-                        ["North", "Central", "South"],
-                        index=["North", "Central", "South"].index(st.session_state.region),
+                        REGIONS,
+                        index=R_IDX[st.session_state.region],
                     )
 
                 st.divider()
                 st.caption("Options")
                 c6, c7, c8 = st.columns(3)
                 with c6:
-                    st.session_state.opt_skylights = st.checkbox("Skylights", value=st.session_state.opt_skylights)
+                    opt_skylights = st.checkbox("Skylights", value=st.session_state.opt_skylights)
                 with c7:
-                    st.session_state.opt_mezzanine = st.checkbox("Mezzanine", value=st.session_state.opt_mezzanine)
+                    opt_mezzanine = st.checkbox("Mezzanine", value=st.session_state.opt_mezzanine)
                 with c8:
-                    st.session_state.opt_hvac = st.checkbox("HVAC", value=st.session_state.opt_hvac)
+                    opt_hvac = st.checkbox("HVAC", value=st.session_state.opt_hvac)
 
                 st.divider()
                 st.caption("Parametric Checklist (affects contingency)")
                 new_checklist = {}
                 for item, val in st.session_state.checklist.items():
                     new_checklist[item] = st.checkbox(item, value=val)
-                st.session_state.checklist = new_checklist
 
                 st.divider()
                 send_col, share_col = st.columns([1.2, 1])
@@ -543,20 +737,32 @@ with left:
                     share_clicked = st.form_submit_button("Create Share Link (fake) 🔗", use_container_width=True)
 
                 if send_clicked:
+                    # Widgets stay bound to locals while editing; state is persisted once, on Send.
+                    st.session_state.update(
+                        project_type=project_type,
+                        structural_system=structural_system,
+                        built_area=built_area,
+                        envelope=envelope,
+                        quality=quality,
+                        region=region,
+                        opt_skylights=opt_skylights,
+                        opt_mezzanine=opt_mezzanine,
+                        opt_hvac=opt_hvac,
+                        checklist=new_checklist,
+                        checklist_bits=pack_checklist(new_checklist),
+                    )
                     st.session_state.sent_flag = True
                     st.session_state.last_sent_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     st.session_state.pulse = False
                     st.toast("Sent!", icon="✅")
                     time.sleep(0.05)
+                    # The phone is a fragment: rerun the whole app so the dashboard picks up the new scenario.
+                    st.rerun()
 
                 if share_clicked:
                     fake_url = f"https://core-inn.hermosillo/sim/{int(time.time())}"
                     st.session_state.fake_link = fake_url
-                    img = qrcode.make(fake_url)
-                    bio = BytesIO()
-                    img.save(bio, format="PNG")
-                    bio.seek(0)
-                    st.session_state.fake_qr = bio.getvalue()
+                    st.session_state.fake_qr = make_qr_png(fake_url)
                     st.toast("Fake share link created")
 
         st.markdown("</div>", unsafe_allow_html=True)
@@ -568,15 +774,19 @@ with left:
             st.image(st.session_state.fake_qr, caption="QR (fake)", width=160)
 
 
+with left:
+    render_phone()
+
+
 # -----------------------------------------------------------------------------
 # Right: Dashboard Panel (cards = bordered containers)
 # -----------------------------------------------------------------------------
-with right:
+def render_dashboard():
     st.markdown("#### Dashboard")
 
     if st.session_state.sent_flag:
         scenario = capture_scenario()
-        calc = compute_simulation(scenario)
+        calc, figs = dashboard_render(scenario)
 
         # 1) Scenario Summary
         with st.container(border=True):
@@ -586,8 +796,7 @@ with right:
         # 2) 3D Model Preview
         with st.container(border=True):
             st.subheader("3D Model Preview")
-            fig3d = make_3d_box(scenario)
-            st.plotly_chart(fig3d, use_container_width=True)
+            st.plotly_chart(figs["box3d"], use_container_width=True)
 
         # 3) Cost & KPIs
         with st.container(border=True):
@@ -600,13 +809,13 @@ with right:
             c_a, c_b = st.columns([1, 1])
             with c_a:
                 st.caption("Cost Distribution")
-                st.plotly_chart(make_donut(calc["cost_buckets"]), use_container_width=True)
+                st.plotly_chart(figs["donut"], use_container_width=True)
             with c_b:
                 st.caption("Quantities")
-                st.plotly_chart(make_quantities_bar(calc), use_container_width=True)
+                st.plotly_chart(figs["quantities"], use_container_width=True)
 
             st.caption("Cost vs. Quality Level")
-            st.plotly_chart(make_quality_line(scenario, calc), use_container_width=True)
+            st.plotly_chart(figs["quality_line"], use_container_width=True)
 
     else:
         with st.container(border=True):
@@ -614,6 +823,10 @@ with right:
             st.write("Use the **Phone** on the left and press **Send to Dashboard** to simulate results.")
 
 
+with right:
+    render_dashboard()
+
+
 # =============================================================================
 # Footer
 # =============================================================================